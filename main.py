@@ -3,6 +3,7 @@ from src.data_validation import DataValidation
 from src.modeling import Modeling
 from src.output_analysis import OutputAnalysis
 
+import logging
 import warnings
 
 # Suppress warnings
@@ -20,6 +21,7 @@ def main():
     modeling = Modeling(service_instance)
     modeling.fit_model(train_data)
     test_data = modeling.predict_outputs(test_data)
+    test_data = data_validation.restore_categories(test_data)
 
     # Output Analysis
     output_analysis = OutputAnalysis(service_instance)
@@ -29,5 +31,8 @@ def main():
     print(weighted_cluster_avg)
 
 if __name__ == "__main__":
+    # Log pipeline progress to stderr
+    logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[logging.StreamHandler()])
+
     # Execute the main function
     main()
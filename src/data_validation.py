@@ -1,7 +1,29 @@
 from src.service import Service
-from sklearn.impute import KNNImputer
+import numpy as np
 import pandas as pd
-from typing import Dict, Union, List, Tuple
+from types import SimpleNamespace
+from typing import Dict, Union, List, Tuple, Optional
+import hashlib
+import joblib
+import logging
+import os
+import re
+import tempfile
+
+# Prefer the GPU-backed KNNImputer from cuML when it is installed, fall back to scikit-learn otherwise
+try:
+    import cupy as cp
+    import cuml
+    from cuml.experimental.preprocessing import KNNImputer
+    _GPU_IMPUTATION = True
+    _IMPUTER_VERSION = cuml.__version__
+except ImportError:
+    import sklearn
+    from sklearn.impute import KNNImputer
+    _GPU_IMPUTATION = False
+    _IMPUTER_VERSION = sklearn.__version__
+
+logger = logging.getLogger(__name__)
 
 
 class DataValidation:
@@ -14,7 +36,9 @@ class DataValidation:
         """
         self.service = service_instance
         self.config = self.service.get_config()
+        self.cfg = SimpleNamespace(**self.config['data_validation'])  # Attribute access to the data_validation settings
         self.imputer = None  # Initialized to None for lazy loading of KNNImputer
+        self.cat_rules = {}  # Mapping of categorical column names to their categories, filled during encoding
 
 
     @Service.log_output
@@ -26,38 +50,44 @@ class DataValidation:
         - Tuple[pd.DataFrame, pd.DataFrame]: Processed train_data and test_data.
         """
         # get data paths, read data
-        data_paths = self.config['data_validation']['read_path']
+        data_paths = self.cfg.read_path
         train_data = self.service.read_csv(data_paths['train_data'])
         test_data = self.service.read_csv(data_paths['test_data'])
 
+        # combine train and test data to run every following step in a single pass
+        n_train = len(train_data)
+        combined_data = pd.concat([train_data, test_data], ignore_index=True)
+
         # get mapping parameters, map column names
-        column_mapping = self.config['data_validation']['column_mapping']
-        train_data = self._map_column_names(train_data, column_mapping)
-        test_data = self._map_column_names(test_data, column_mapping)
+        column_mapping = self.cfg.column_mapping
+        combined_data = self._map_column_names(combined_data, column_mapping)
 
         # get replacement parameters, run replacement
-        replacement_dict = self.config['data_validation']['replacement_dict']
-        train_data = self._replace_column_names(train_data, replacement_dict)
-        test_data = self._replace_column_names(test_data, replacement_dict)
+        replacement_dict = self.cfg.replacement_dict
+        combined_data = self._replace_column_names(combined_data, replacement_dict)
 
-        # get categorical columns and validate dtypes
-        categorical_columns = self.config['data_validation']['categorical_columns']
-        train_data = self._validate_dtypes(train_data, categorical_columns)
-        test_data = self._validate_dtypes(test_data, categorical_columns)
+        # get deduplication columns, remove duplicates within each split
+        dedup_subset = getattr(self.cfg, 'dedup_subset', None)
+        combined_data, n_train = self._remove_duplicates(combined_data, n_train, dedup_subset)
 
-        # remove duplicates
-        train_data = self._remove_duplicates(train_data)
-        test_data = self._remove_duplicates(test_data)
+        # get categorical columns and encode them as integer codes
+        categorical_columns = self.cfg.categorical_columns
+        combined_data = self._encode_categorical_columns(combined_data, categorical_columns)
 
         # get imputation columns and run imputation
-        imputation_parameters = self.config['data_validation']['imputation']
-        train_data = self._impute_missing_values(train_data, **imputation_parameters)
-        test_data = self._impute_missing_values(test_data, **imputation_parameters)
+        imputation_parameters = self.cfg.imputation
+        combined_data = self._impute_missing_values(combined_data, **imputation_parameters)
 
         # get filtering parameters and run filtering
-        columns_to_include = self.config['data_validation']['columns_to_include']
-        train_data = self._filter_columns(train_data, columns_to_include)
-        test_data = self._filter_columns(test_data, columns_to_include)
+        columns_to_include = self.cfg.columns_to_include
+        combined_data = self._filter_columns(combined_data, columns_to_include)
+
+        # downcast numeric columns to float32 ahead of modeling
+        combined_data = self._downcast_numeric_columns(combined_data)
+
+        # split the combined data back into train and test data, test data indexed from 0 again
+        train_data = combined_data.iloc[:n_train]
+        test_data = combined_data.iloc[n_train:].reset_index(drop=True)
 
         return train_data, test_data
 
@@ -85,59 +115,151 @@ class DataValidation:
         Returns:
         - pd.DataFrame: DataFrame with updated column names.
         """
-        for to_replace, replacement in replacement_dict.items():
-            dataframe.columns = dataframe.columns.str.replace(to_replace, replacement).str.lower()
+        if not replacement_dict:
+            return dataframe
+
+        # combine all patterns into a single regex, each in its own named group
+        replacements = list(replacement_dict.values())
+        pattern = re.compile('|'.join(f'(?P<r{i}>{to_replace})' for i, to_replace in enumerate(replacement_dict)))
+
+        dataframe.columns = [
+            pattern.sub(lambda match: replacements[int(match.lastgroup[1:])], column).lower()
+            for column in dataframe.columns
+        ]
         return dataframe
 
-    def _validate_dtypes(self, dataframe: pd.DataFrame, categorical_columns: Union[str, List[str]]) -> pd.DataFrame:
+    def _encode_categorical_columns(self, dataframe: pd.DataFrame, categorical_columns: Union[str, List[str]]) -> pd.DataFrame:
         """
-        Validates and converts specified columns to categorical dtype in the DataFrame.
+        Encodes specified columns as integer codes and stores their categories in cat_rules.
 
         Parameters:
         - dataframe (pd.DataFrame): Input DataFrame.
-        - categorical_columns (Union[str, List[str]]): Column(s) to convert to categorical dtype.
+        - categorical_columns (Union[str, List[str]]): Column(s) to encode as integer codes.
 
         Returns:
-        - pd.DataFrame: DataFrame with specified columns converted to categorical dtype.
+        - pd.DataFrame: DataFrame with specified columns replaced by integer codes (-1 for missing values).
         """
-        dataframe[categorical_columns] = dataframe[categorical_columns].astype('category')
+        if isinstance(categorical_columns, str):
+            categorical_columns = [categorical_columns]
+
+        # store the codes in the smallest signed integer dtype, so they do not promote float32 features
+        for column in categorical_columns:
+            codes, self.cat_rules[column] = pd.factorize(dataframe[column])
+            dataframe[column] = pd.to_numeric(codes, downcast='integer')
         return dataframe
 
-    def _remove_duplicates(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+    def restore_categories(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
-        Removes duplicate rows from the DataFrame.
+        Restores encoded columns in the DataFrame to categorical dtype using the stored cat_rules.
 
         Parameters:
-        - dataframe (pd.DataFrame): Input DataFrame.
+        - dataframe (pd.DataFrame): DataFrame with integer-coded categorical columns.
 
         Returns:
-        - pd.DataFrame: DataFrame with duplicate rows removed.
+        - pd.DataFrame: DataFrame with encoded columns converted back to categorical dtype.
         """
-        return dataframe.drop_duplicates()
+        for column, categories in self.cat_rules.items():
+            if column in dataframe.columns:
+                dataframe[column] = pd.Categorical.from_codes(dataframe[column].to_numpy(), categories=categories)
+        return dataframe
+
+    def _remove_duplicates(self, dataframe: pd.DataFrame, n_train: int,
+                           subset: Optional[List[str]] = None) -> Tuple[pd.DataFrame, int]:
+        """
+        Removes duplicate rows from the combined DataFrame, separately for the train and test rows.
+
+        Parameters:
+        - dataframe (pd.DataFrame): Input DataFrame with the n_train train rows followed by the test rows.
+        - n_train (int): Number of train rows at the start of the DataFrame.
+        - subset (Optional[List[str]]): Columns defining a duplicate row. All columns are used if None.
+
+        Returns:
+        - Tuple[pd.DataFrame, int]: DataFrame with duplicate rows removed and the remaining number of train rows.
+        """
+        columns = dataframe.columns if subset is None else subset
+        row_hashes = pd.util.hash_pandas_object(dataframe[columns], index=False).to_numpy()
+        is_train = np.arange(len(dataframe)) < n_train
+
+        # a row is a duplicate only if an identical row precedes it within the same split
+        is_duplicate = pd.DataFrame({'row_hash': row_hashes, 'is_train': is_train}).duplicated().to_numpy()
+        return dataframe[~is_duplicate], int((is_train & ~is_duplicate).sum())
 
     def _impute_missing_values(self, dataframe: pd.DataFrame, columns_to_impute: List[str], n_neighbors: int,
-                               method: str = 'fit_transform') -> pd.DataFrame:
+                               fit_sample_size: Optional[int] = None, cache_dir: Optional[str] = None) -> pd.DataFrame:
         """
-        Imputes missing values in specified columns using KNNImputer.
+        Imputes missing values in specified columns using KNNImputer (cuML on GPU when available, scikit-learn otherwise).
 
         Parameters:
         - dataframe (pd.DataFrame): Input DataFrame.
         - columns_to_impute (List[str]): Columns with missing values to impute.
         - n_neighbors (int): Number of neighbors to consider in KNNImputer.
-        - method (str): Imputation method, 'fit_transform' for training data, 'transform' for test data.
+        - fit_sample_size (Optional[int]): Maximum number of rows to fit KNNImputer on. Larger inputs are imputed
+          from a random sample of their complete rows. All rows are used if None.
+        - cache_dir (Optional[str]): Directory to cache the fitted imputer and imputed values in, keyed by
+          a hash of the input data. Caching is disabled if None.
 
         Returns:
         - pd.DataFrame: DataFrame with missing values imputed.
         """
         numeric_df = dataframe.select_dtypes(include='number')
+        values = numeric_df[columns_to_impute].to_numpy(dtype=np.float32)
+
+        # reuse the imputation from a previous run on the same data if it is cached
+        cache_path = None
+        if cache_dir:
+            # the key covers the imputer implementation and version, so caches from other setups are never loaded
+            key_parameters = (KNNImputer.__module__, KNNImputer.__name__, _IMPUTER_VERSION,
+                              columns_to_impute, n_neighbors, fit_sample_size)
+            cache_key = hashlib.blake2b(repr(key_parameters).encode(), digest_size=16)
+            cache_key.update(values.tobytes())
+            cache_path = os.path.join(cache_dir, f'imputer_{cache_key.hexdigest()}.joblib')
+            if os.path.exists(cache_path):
+                try:
+                    imputer, imputed_values = joblib.load(cache_path)
+                except Exception as error:
+                    logger.warning("DataValidation: ignoring unreadable imputer cache %s (%s), refitting",
+                                   cache_path, error)
+                else:
+                    self.imputer = imputer
+                    dataframe[columns_to_impute] = imputed_values
+                    return dataframe
 
         if not self.imputer:
             self.imputer = KNNImputer(n_neighbors=n_neighbors)
 
-        if method == 'fit_transform':
-            dataframe[columns_to_impute] = self.imputer.fit_transform(numeric_df[columns_to_impute])
-        if method == 'transform':
-            dataframe[columns_to_impute] = self.imputer.transform(numeric_df[columns_to_impute])
+        # fit on a random sample of complete rows for tall data to keep the pairwise distance computation linear in rows
+        fit_values = None
+        if fit_sample_size and len(values) > fit_sample_size:
+            complete_values = values[~np.isnan(values).any(axis=1)]
+            donor_values = complete_values if len(complete_values) >= fit_sample_size else values
+            sample_rows = np.random.default_rng(0).choice(len(donor_values), size=fit_sample_size, replace=False)
+            fit_values = donor_values[sample_rows]
+
+        if _GPU_IMPUTATION:
+            values = cp.asarray(values)
+            if fit_values is not None:
+                fit_values = cp.asarray(fit_values)
+
+        if fit_values is None:
+            imputed_values = self.imputer.fit_transform(values)
+        else:
+            imputed_values = self.imputer.fit(fit_values).transform(values)
+
+        if _GPU_IMPUTATION:
+            imputed_values = cp.asnumpy(imputed_values)
+        dataframe[columns_to_impute] = imputed_values
+
+        if cache_path:
+            # dump to a temporary file first, so an interrupted write never leaves a truncated cache file behind
+            os.makedirs(cache_dir, exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            os.close(file_descriptor)
+            try:
+                joblib.dump((self.imputer, imputed_values), temp_path)
+                os.replace(temp_path, cache_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
 
         return dataframe
 
@@ -152,4 +274,28 @@ class DataValidation:
         Returns:
         - pd.DataFrame: DataFrame with only specified columns.
         """
-        return dataframe[columns_to_include]
+        columns_index = pd.Index(columns_to_include)
+
+        missing_columns = columns_index.difference(dataframe.columns)
+        if len(missing_columns):
+            raise KeyError(f"Columns not found in DataFrame: {list(missing_columns)}")
+
+        # drop the few unneeded columns when the kept ones are already in order, otherwise select by reindexing
+        drop_columns = dataframe.columns.difference(columns_index)
+        if len(drop_columns) < len(columns_index) and dataframe.columns.drop(drop_columns).equals(columns_index):
+            return dataframe.drop(columns=drop_columns)
+        return dataframe.reindex(columns=columns_index, copy=False)
+
+    def _downcast_numeric_columns(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Downcasts numeric columns in the DataFrame to float32, leaving the encoded categorical columns as integer codes.
+
+        Parameters:
+        - dataframe (pd.DataFrame): Input DataFrame.
+
+        Returns:
+        - pd.DataFrame: DataFrame with numeric columns converted to float32.
+        """
+        numeric_columns = dataframe.select_dtypes(include='number').columns.difference(list(self.cat_rules), sort=False)
+        dataframe[numeric_columns] = dataframe[numeric_columns].astype(np.float32)
+        return dataframe
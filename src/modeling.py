@@ -1,9 +1,21 @@
 from src.service import Service
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score, mean_absolute_percentage_error
 import lightgbm as lgb
+from types import SimpleNamespace
 from typing import Tuple
+import logging
+import os
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
+# Categorical features with more categories than this are fit as numeric ones (LightGBM GPU learners fail above it)
+_MAX_CATEGORIES = 32768
+
+# Number of threads used by LightGBM for training and prediction, limited to the CPUs this process may run on
+_N_THREADS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
 class Modeling:
     def __init__(self, service_instance: Service):
         """
@@ -14,7 +26,10 @@ class Modeling:
         """
         self.service = service_instance
         self.config = self.service.get_config()
+        self.cfg = SimpleNamespace(**self.config['modeling'])  # Attribute access to the modeling settings
         self.model = None  # Placeholder for the trained model
+        self.feature_columns = None  # Feature columns the model was trained on
+        self.train_set = None  # Binned LightGBM Dataset the model was trained on
 
     def _prepare_data(self, dataframe, target_variable: str, ignore_columns: list) -> Tuple[pd.DataFrame, pd.Series]:
         """
@@ -36,7 +51,7 @@ class Modeling:
     @Service.log_output
     def fit_model(self, train_data: pd.DataFrame):
         """
-        Fits the LightGBM model to the training data.
+        Fits the LightGBM model to the training data, binning it into a LightGBM Dataset once.
 
         Parameters:
         - train_data (pd.DataFrame): Training data.
@@ -44,11 +59,30 @@ class Modeling:
         Returns:
         - None
         """
-        split_parameters = self.config['modeling']['split_parameters']
+        split_parameters = self.cfg.split_parameters
         X, y = self._prepare_data(train_data, **split_parameters)
-
-        model_parameters = self.config['modeling']['model_parameters']
-        self.model = lgb.LGBMRegressor(**model_parameters).fit(X, y)
+        self.feature_columns = X.columns
+
+        categorical_columns = self.config['data_validation']['categorical_columns']
+        categorical_feature = [
+            column for column in X.columns
+            if column in categorical_columns and X[column].max() < _MAX_CATEGORIES
+        ]
+
+        model_parameters = {'objective': 'regression', 'n_jobs': _N_THREADS, **self.cfg.model_parameters}
+        self.train_set = lgb.Dataset(X, label=y, categorical_feature=categorical_feature, free_raw_data=True)
+        try:
+            self.model = lgb.train(model_parameters, self.train_set)
+        except lgb.basic.LightGBMError as error:
+            # only a LightGBM build without GPU support falls back, other errors (e.g. GPU out of memory) are raised
+            if model_parameters.get('device_type', 'cpu') == 'cpu' or 'not enabled in this build' not in str(error):
+                raise
+            # fall back to CPU training on a freshly binned Dataset
+            logger.warning("Modeling.fit_model: device_type=%s is unavailable (%s), training on CPU",
+                           model_parameters['device_type'], error)
+            cpu_parameters = {**model_parameters, 'device_type': 'cpu'}
+            self.train_set = lgb.Dataset(X, label=y, categorical_feature=categorical_feature, free_raw_data=True)
+            self.model = lgb.train(cpu_parameters, self.train_set)
 
     @Service.log_output
     def predict_outputs(self, test_data: pd.DataFrame) -> pd.DataFrame:
@@ -61,11 +95,11 @@ class Modeling:
         Returns:
         - pd.DataFrame: Test data with predicted target variable.
         """
-        split_parameters = self.config['modeling']['split_parameters']
-        X_test, _ = self._prepare_data(test_data, **split_parameters)
-        y_pred = self.model.predict(X_test)
+        split_parameters = self.cfg.split_parameters
+        X_test = test_data[self.feature_columns]
+        y_pred = self.model.predict(X_test, num_threads=_N_THREADS).astype(np.float32)
 
-        test_data[split_parameters['target_variable']] = y_pred
+        test_data.loc[:, split_parameters['target_variable']] = y_pred
         return test_data
 
     def calculate_regression_metrics(self, model_name: str, y_test, y_pred, display=True) -> Tuple[float, float, float, float, float, float]:
@@ -1,7 +1,52 @@
 from src.service import Service
+import numpy as np
 import pandas as pd
 from typing import Dict
 
+# Use a Numba-compiled kernel for the cluster sums on tall data with few clusters when Numba is installed
+try:
+    import numba
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+# loading the cached kernel costs ~0.4-0.5s once per process, which only pays off against groupby on very tall data
+_NUMBA_MIN_ROWS = 50_000_000
+_NUMBA_MAX_CLUSTERS = 1024
+
+if _NUMBA_AVAILABLE:
+    # fastmath without the no-NaN flag, so missing values can still be skipped like in pandas sums
+    @numba.njit(parallel=True, fastmath={'reassoc', 'contract', 'arcp'}, cache=True)
+    def _wca_kernel(codes, area, yld, n_clusters, n_chunks):
+        """
+        Sums area * yield and area per cluster code, skipping missing values and negative codes.
+
+        Parameters:
+        - codes (np.ndarray): Cluster code of each row, -1 for a missing cluster.
+        - area (np.ndarray): Area of each row.
+        - yld (np.ndarray): Yield of each row.
+        - n_clusters (int): Number of distinct cluster codes.
+        - n_chunks (int): Number of row chunks to accumulate in parallel, usually the number of Numba threads.
+
+        Returns:
+        - Tuple[np.ndarray, np.ndarray]: Weighted yield sums and area sums, one per cluster code.
+        """
+        chunk_size = (len(codes) + n_chunks - 1) // n_chunks
+        weighted_sums = np.zeros((n_chunks, n_clusters))
+        area_sums = np.zeros((n_chunks, n_clusters))
+
+        # every thread accumulates its own chunk of rows, the partial sums are reduced at the end
+        for chunk in numba.prange(n_chunks):
+            for i in range(chunk * chunk_size, min((chunk + 1) * chunk_size, len(codes))):
+                code = codes[i]
+                if code < 0 or np.isnan(area[i]):
+                    continue
+                area_sums[chunk, code] += area[i]
+                if not np.isnan(yld[i]):
+                    weighted_sums[chunk, code] += area[i] * yld[i]
+
+        return weighted_sums.sum(axis=0), area_sums.sum(axis=0)
+
 
 class OutputAnalysis:
     def __init__(self, service_instance: Service):
@@ -30,17 +75,47 @@ class OutputAnalysis:
         required_columns = self.config['output_analysis']['wca_parameters']
 
         # Calculate weighted cluster averages
-        weighted_avg = (
-            data.groupby('cluster')
-                .apply(lambda cluster_data: 
-                    (cluster_data[required_columns['area']] * cluster_data[required_columns['yield']]).sum() / cluster_data[required_columns['area']].sum())
-                .rename('wca')
+        clusters = data[required_columns['cluster']]
+        weighted_avg = self._weighted_average_by_cluster(
+            data[required_columns['area']], data[required_columns['yield']], clusters
         )
 
-        result = pd.merge(data, weighted_avg, left_on='cluster', right_index=True)
+        # keep only rows with a matching cluster average, like an inner join, then look the averages up per row
+        # (mapping a categorical cluster column returns categories, hence the cast)
+        has_average = clusters.isin(weighted_avg.index).to_numpy()
+        result = data[has_average].copy()
+        result['wca'] = clusters[has_average].map(weighted_avg).astype(weighted_avg.dtype)
 
         if save_results:
             output_path = self.config['output_analysis']['output_path']
             self.service.write_csv(output_path, result)
 
         return result
+
+    def _weighted_average_by_cluster(self, area: pd.Series, yields: pd.Series, clusters: pd.Series) -> pd.Series:
+        """
+        Calculate the area-weighted average yield of each cluster.
+
+        Uses the Numba kernel for more than _NUMBA_MIN_ROWS rows with fewer than _NUMBA_MAX_CLUSTERS clusters,
+        pandas groupby sums otherwise.
+
+        Parameters:
+        - area (pd.Series): Area of each row.
+        - yields (pd.Series): Yield of each row.
+        - clusters (pd.Series): Cluster of each row.
+
+        Returns:
+        - pd.Series: Weighted averages named 'wca', indexed by cluster.
+        """
+        if _NUMBA_AVAILABLE and len(clusters) > _NUMBA_MIN_ROWS:
+            codes, uniques = pd.factorize(clusters)
+            if len(uniques) < _NUMBA_MAX_CLUSTERS:
+                # the thread count is passed in rather than read inside the kernel, so its compilation can be cached
+                weighted_sums, area_sums = _wca_kernel(
+                    codes.astype(np.int32), area.to_numpy(), yields.to_numpy(), len(uniques), numba.get_num_threads()
+                )
+                # match the dtype of the pandas path, which keeps the dtype of the area and yield columns
+                weighted_avg = (weighted_sums / area_sums).astype(np.result_type(area.dtype, yields.dtype))
+                return pd.Series(weighted_avg, index=uniques, name='wca')
+
+        return ((area * yields).groupby(clusters).sum() / area.groupby(clusters).sum()).rename('wca')
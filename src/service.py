@@ -1,8 +1,87 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import yaml
-from functools import wraps
+from functools import lru_cache, wraps
+from typing import Any
+import logging
+import os
 import time
 
+logger = logging.getLogger(__name__)
+
+# Use the libyaml-based C loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+
+class FrozenDict(dict):
+    """
+    A read-only dict. Stays picklable and deep-copyable, unlike types.MappingProxyType.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(f"{self.__class__.__name__} is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+
+class FrozenList(list):
+    """
+    A read-only list. Stays picklable and deep-copyable.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(f"{self.__class__.__name__} is read-only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Recursively converts dicts and lists to their read-only FrozenDict and FrozenList counterparts.
+
+    Parameters:
+    - value (Any): Value loaded from the YAML file.
+
+    Returns:
+    Any: Read-only copy of the value.
+    """
+    if isinstance(value, dict):
+        return FrozenDict({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return FrozenList(_freeze(item) for item in value)
+    return value
+
+
+@lru_cache(maxsize=None)
+def _load_config(config_file_path: str, modification_time: float) -> dict:
+    """
+    Parses a YAML configuration file once per resolved path and modification time.
+
+    The cached result is never handed out directly, callers get their own frozen copy of it.
+
+    Parameters:
+    - config_file_path (str): Resolved path to the YAML configuration file.
+    - modification_time (float): Modification time of the file, so edits invalidate the cached result.
+
+    Returns:
+    dict: Configuration settings loaded from the YAML file.
+    """
+    with open(config_file_path, 'r') as config_file:
+        config = yaml.load(config_file, Loader=_Loader)
+    return config
+
+
 class Service:
     """
     A service class for reading and writing CSV files and handling configuration using pandas and YAML.
@@ -11,7 +90,7 @@ class Service:
     - config_file_path (str): Path to the YAML configuration file.
 
     Attributes:
-    - config (dict): Configuration settings loaded from the YAML file.
+    - config (FrozenDict): Read-only configuration settings loaded from the YAML file.
     """
 
     def __init__(self, config_file_path:str='config.yaml'):
@@ -52,19 +131,19 @@ class Service:
             class_name = args[0].__class__.__name__
             func_name = func.__name__
 
-            start_time = time.time()
-            print(f"{class_name}.{func_name} started")
+            start_time = time.perf_counter_ns()
+            logger.info("%s.%s started", class_name, func_name)
             result = func(*args, **kwargs)
-            end_time = time.time()
-  
-            execution_time = end_time - start_time
-            print(f"{class_name}.{func_name} finished. Took {execution_time:.2f} seconds")
+            end_time = time.perf_counter_ns()
+
+            execution_time = (end_time - start_time) / 1e9
+            logger.info("%s.%s finished. Took %.2f seconds", class_name, func_name, execution_time)
             return result
         return wrapper
 
     def read_csv(self, file_path: str) -> pd.DataFrame:
         """
-        Reads a CSV file using pandas.
+        Reads a CSV file using pandas with the multi-threaded pyarrow engine.
 
         Parameters:
         - file_path (str): Path to the CSV file.
@@ -72,41 +151,71 @@ class Service:
         Returns:
         pd.DataFrame: DataFrame containing the CSV data.
         """
-        data = pd.read_csv(file_path)
+        data = pd.read_csv(file_path, engine='pyarrow')
+        return data
+
+    def read_parquet(self, file_path: str) -> pd.DataFrame:
+        """
+        Reads a Parquet file using pandas with the pyarrow engine.
+
+        Parameters:
+        - file_path (str): Path to the Parquet file.
+
+        Returns:
+        pd.DataFrame: DataFrame containing the Parquet data.
+        """
+        data = pd.read_parquet(file_path, engine='pyarrow')
         return data
 
     def write_csv(self, file_path: str, data: pd.DataFrame) -> None:
         """
-        Writes a DataFrame to a CSV file using pandas.
+        Writes a DataFrame to a CSV file using the multi-threaded pyarrow writer.
+
+        The output is gzip-compressed if the path has a .csv.gz suffix, and written as Parquet instead
+        if the path has a .parquet suffix.
 
         Parameters:
-        - file_path (str): Path to the output CSV file.
-        - data (pd.DataFrame): DataFrame to be written to the CSV file.
+        - file_path (str): Path to the output CSV or Parquet file.
+        - data (pd.DataFrame): DataFrame to be written to the file.
 
         Returns:
         None
         """
-        data.to_csv(file_path, index=False)
-
-    def _read_config(self, config_file_path: str) -> dict:
+        if file_path.endswith('.parquet'):
+            data.to_parquet(file_path, engine='pyarrow', compression='snappy', index=False)
+            return
+
+        table = pa.Table.from_pandas(data, preserve_index=False)
+
+        # pyarrow always quotes header names, so the header is written by pandas to keep the to_csv format
+        header = data.iloc[:0].to_csv(index=False).encode()
+        write_options = pacsv.WriteOptions(include_header=False, quoting_style='needed')
+        if file_path.endswith('.gz'):
+            output_stream = pa.CompressedOutputStream(file_path, 'gzip')
+        else:
+            output_stream = pa.OSFile(file_path, 'wb')
+        with output_stream:
+            output_stream.write(header)
+            pacsv.write_csv(table, output_stream, write_options=write_options)
+
+    def _read_config(self, config_file_path: str) -> FrozenDict:
         """
-        Reads the YAML configuration file.
+        Reads the YAML configuration file, reusing the parsed result for an unchanged file.
 
         Parameters:
         - config_file_path (str): Path to the YAML configuration file.
 
         Returns:
-        dict: Configuration settings loaded from the YAML file.
+        FrozenDict: Read-only configuration settings loaded from the YAML file.
         """
-        with open(config_file_path, 'r') as config_file:
-            config = yaml.safe_load(config_file)
-        return config
+        real_path = os.path.realpath(config_file_path)
+        return _freeze(_load_config(real_path, os.path.getmtime(real_path)))
     
-    def get_config(self) -> dict:
+    def get_config(self) -> FrozenDict:
         """
         Retrieves the current configuration settings.
 
         Returns:
-        dict: Configuration settings.
+        FrozenDict: Read-only configuration settings.
         """
         return self.config
\ No newline at end of file